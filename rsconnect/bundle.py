@@ -2,10 +2,16 @@
 Manifest generation and bundling utilities
 """
 
+import concurrent.futures
+import contextlib
+import functools
 import hashlib
 import io
+import itertools
 import json
+import mmap
 import os
+import shutil
 import subprocess
 import sys
 import tarfile
@@ -22,11 +28,16 @@ try:
 except ImportError:
     typing = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from os.path import basename, dirname, exists, isdir, join, relpath, splitext, isfile, abspath
 
 from .log import logger
 from .models import AppMode, AppModes, GlobSet
-from .environment import Environment, MakeEnvironment
+from .environment import Environment, EnvironmentException, MakeEnvironment, environment_info
 from .exception import RSConnectException
 
 _module_pattern = re.compile(r"^[A-Za-z0-9_]+:[A-Za-z0-9_]+$")
@@ -47,6 +58,39 @@ directories_to_ignore = [
     "rsconnect/",
     "venv/",
 ]
+# All of the ignored directory prefixes as one pattern, so a path is checked in a
+# single match rather than one startswith per prefix.
+_directories_to_ignore_pattern = re.compile("|".join(re.escape(d) for d in directories_to_ignore))
+
+
+def json_dumps(data, pretty=False):
+    """
+    Serialize the given data as JSON text.  If orjson is installed, it is used
+    for speed; otherwise, the standard json module is used.
+
+    :param data: the data to serialize.
+    :param pretty: if True, indent nested structures by two spaces.
+    :return: the JSON text as a string.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0).decode("utf-8")
+    return json.dumps(data, indent=2 if pretty else None)
+
+
+def json_loads(raw):
+    """
+    Parse the given JSON text, which may be a string or UTF-8 encoded bytes.  If
+    orjson is installed, it is used for speed; otherwise, the standard json module
+    is used.
+
+    :param raw: the JSON text to parse.
+    :return: the parsed data.
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    return json.loads(raw)
 
 
 # noinspection SpellCheckingInspection
@@ -108,6 +152,20 @@ def make_source_manifest(
     return manifest
 
 
+def manifest_add_jupyter_options(manifest, hide_all_input, hide_tagged_input):
+    """Add the notebook rendering options to the manifest jupyter section
+
+    The section is only created when at least one of the options is set.
+    """
+    options = {}
+    if hide_all_input:
+        options["hide_all_input"] = hide_all_input
+    if hide_tagged_input:
+        options["hide_tagged_input"] = hide_tagged_input
+    if options:
+        manifest.setdefault("jupyter", {}).update(options)
+
+
 def manifest_add_file(manifest, rel_path, base_dir):
     """Add the specified file to the manifest files section
 
@@ -119,24 +177,83 @@ def manifest_add_file(manifest, rel_path, base_dir):
     manifest["files"][rel_path] = {"checksum": file_checksum(path)}
 
 
+def manifest_add_files(manifest, rel_paths, base_dir):
+    """Add the specified files to the manifest files section
+
+    The files must be specified as pathnames relative to the notebook directory.
+    This is equivalent to calling `manifest_add_file` for each path, but the
+    checksums are computed together by `file_checksums`.
+    """
+    rel_paths = list(rel_paths)
+    if not rel_paths:
+        return
+    if os.path.isdir(base_dir):
+        paths = [join(base_dir, rel_path) for rel_path in rel_paths]
+    else:
+        paths = rel_paths
+    checksums = file_checksums(paths)
+    if "files" not in manifest:
+        manifest["files"] = {}
+    for rel_path, path in zip(rel_paths, paths):
+        manifest["files"][rel_path] = {"checksum": checksums[path]}
+
+
 def manifest_add_buffer(manifest, filename, buf):
     """Add the specified in-memory buffer to the manifest files section"""
     manifest["files"][filename] = {"checksum": buffer_checksum(buf)}
 
 
-def make_hasher():
+def _md5_constructor():
     try:
-        return hashlib.md5()
+        hashlib.md5()
+        return hashlib.md5
     except Exception:
         # md5 is not available in FIPS mode, see if the usedforsecurity option is available
         # (it was added in python 3.9). We set usedforsecurity=False since we are only
         # using this for a file upload integrity check.
-        return hashlib.md5(usedforsecurity=False)
+        return functools.partial(hashlib.md5, usedforsecurity=False)
+
+
+# Resolved once, so that checksumming doesn't retry (and, in FIPS mode, fail) the
+# plain md5 constructor for every file.
+_md5 = _md5_constructor()
+
+
+def make_hasher():
+    return _md5()
+
+
+# The most threads file_checksums will use.
+max_checksum_workers = 8
+
+# file_checksums only uses threads when the files add up to at least this many bytes.
+parallel_checksum_threshold = 1024 * 1024
+
+# Files larger than this are memory mapped for checksumming rather than read in chunks.
+mmap_checksum_threshold = 128 * 1024
 
 
 def file_checksum(path):
     """Calculate the md5 hex digest of the specified file"""
     with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > mmap_checksum_threshold:
+            try:
+                # Hashing the mapped pages directly avoids copying the file through
+                # user space buffers.
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    m = make_hasher()
+                    m.update(mapped)
+                    return m.hexdigest()
+            except (OSError, ValueError):
+                # Not all files can be mapped (e.g. on some network file systems, or
+                # when there is no room in the address space); read them instead.
+                logger.debug("unable to memory map %s for checksumming", path)
+
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+ reads into a single reusable buffer rather than
+            # allocating a new bytes object for every chunk.
+            return hashlib.file_digest(f, _md5).hexdigest()
+
         m = make_hasher()
         chunk_size = 64 * 1024
 
@@ -147,6 +264,31 @@ def file_checksum(path):
         return m.hexdigest()
 
 
+def _total_size_reaches(paths, threshold):
+    """Return whether the files add up to at least `threshold` bytes, stopping as soon as they do."""
+    return any(total >= threshold for total in itertools.accumulate(map(os.path.getsize, paths)))
+
+
+def file_checksums(paths):
+    """Calculate the md5 hex digests of the specified files
+
+    When there is enough data and more than one CPU, the files are read and hashed
+    on a small thread pool; hashlib releases the GIL while hashing, so both the I/O
+    and the hashing overlap across files.  Otherwise the pool would cost more than
+    it saves, so the files are hashed one after another.
+
+    :param paths: the files to checksum.
+    :return: a dictionary mapping each path to its md5 hex digest.
+    """
+    paths = list(paths)
+    max_workers = min(len(paths), max_checksum_workers, os.cpu_count() or 1)
+    if max_workers < 2 or not _total_size_reaches(paths, parallel_checksum_threshold):
+        return {path: file_checksum(path) for path in paths}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(file_checksum, paths)))
+
+
 def buffer_checksum(buf):
     """Calculate the md5 hex digest of a buffer (str or bytes)"""
     m = make_hasher()
@@ -155,6 +297,14 @@ def buffer_checksum(buf):
 
 
 def to_bytes(s):
+    # Exact type checks first; they are cheaper than isinstance and cover nearly
+    # every call.
+    t = type(s)
+    if t is bytes:
+        return s
+    if t is str:
+        return s.encode("utf-8")
+
     if isinstance(s, bytes):
         return s
     elif hasattr(s, "encode"):
@@ -185,6 +335,51 @@ def bundle_add_buffer(bundle, filename, contents):
     bundle.addfile(file_info, buf)
 
 
+# The gzip compression level used for bundles.  tarfile defaults to level 9, which
+# costs a lot of CPU time for very little size gain over gzip's usual default of 6.
+bundle_compression_level = 6
+
+
+@contextlib.contextmanager
+def open_bundle_tarball(bundle_file, which=shutil.which):
+    """Open a gzip compressed tarball for writing into the given file.
+
+    If `pigz` is available, the tar stream is piped through it so that
+    compression uses all available cores.  Otherwise, Python's own gzip
+    support is used.
+
+    :param bundle_file: the binary file object to write the tarball to.
+    :param which: the function used to locate the `pigz` executable.
+    :return: a context manager yielding the open tarfile.TarFile.
+    """
+    pigz = which("pigz")
+    if not pigz:
+        with tarfile.open(mode="w:gz", fileobj=bundle_file, compresslevel=bundle_compression_level) as bundle:
+            yield bundle
+        return
+
+    logger.debug("compressing bundle with %s", pigz)
+    bundle_file.flush()
+    args = [pigz, "-n", "-c", "-%d" % bundle_compression_level]
+    proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=bundle_file)
+    broken_pipe = False
+    try:
+        with tarfile.open(mode="w|", fileobj=proc.stdin) as bundle:
+            yield bundle
+    except BrokenPipeError:
+        # pigz went away before reading all of its input; its exit status says why.
+        broken_pipe = True
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            broken_pipe = True
+        status = proc.wait()
+
+    if broken_pipe or status != 0:
+        raise RSConnectException("Error compressing bundle: %s exited with code %d" % (pigz, status))
+
+
 def write_manifest(
     relative_dir: str,
     nb_name: str,
@@ -203,14 +398,7 @@ def write_manifest(
     """
     manifest_filename = "manifest.json"
     manifest = make_source_manifest(AppModes.JUPYTER_NOTEBOOK, environment, nb_name, None, image)
-    if hide_all_input:
-        if "jupyter" not in manifest:
-            manifest["jupyter"] = {}
-        manifest["jupyter"].update({"hide_all_input": hide_all_input})
-    if hide_tagged_input:
-        if "jupyter" not in manifest:
-            manifest["jupyter"] = {}
-        manifest["jupyter"].update({"hide_tagged_input": hide_tagged_input})
+    manifest_add_jupyter_options(manifest, hide_all_input, hide_tagged_input)
     manifest_file = join(output_dir, manifest_filename)
     created = []
     skipped = []
@@ -219,8 +407,8 @@ def write_manifest(
     if exists(manifest_file):
         skipped.append(manifest_relative_path)
     else:
-        with open(manifest_file, "w") as f:
-            f.write(json.dumps(manifest, indent=2))
+        with open(manifest_file, "w", encoding="utf-8") as f:
+            f.write(json_dumps(manifest, pretty=True))
             created.append(manifest_relative_path)
             logger.debug("wrote manifest file: %s", manifest_file)
 
@@ -238,7 +426,44 @@ def write_manifest(
     return created, skipped
 
 
-def list_files(base_dir, include_sub_dirs, walk=os.walk):
+def walk_files(base_dir, include_sub_dirs=True, skip_dirs=(), scandir=os.scandir):
+    """Walk the files in the directory at base_dir.
+
+    Like os.walk, symlinks to directories are not followed and directories that
+    can't be read are ignored.  Directory entries carry their file type from the
+    directory listing itself, so no file needs a separate stat call, and relative
+    paths are built up as the walk descends instead of with relpath.
+
+    :param base_dir: the directory to walk.
+    :param include_sub_dirs: if True, recursively walk subdirectories.
+    :param skip_dirs: the names of subdirectories not to walk into.
+    :param scandir: the function used to list a directory.
+    :return: an iterable of (path, path relative to base_dir) tuples, one per file.
+    """
+
+    def iter_files(dir_path, rel_dir):
+        try:
+            entries = list(scandir(dir_path))
+        except OSError:
+            return
+
+        sub_dirs = []
+        for entry in entries:
+            rel_path = join(rel_dir, entry.name) if rel_dir else entry.name
+            if entry.is_dir():
+                if include_sub_dirs and entry.name not in skip_dirs and not entry.is_symlink():
+                    sub_dirs.append((entry.path, rel_path))
+            else:
+                yield entry.path, rel_path
+
+        for sub_dir_path, sub_dir_rel_path in sub_dirs:
+            for paths in iter_files(sub_dir_path, sub_dir_rel_path):
+                yield paths
+
+    return iter_files(base_dir, "")
+
+
+def list_files(base_dir, include_sub_dirs, scandir=os.scandir):
     """List the files in the directory at path.
 
     If include_sub_dirs is True, recursively list
@@ -247,21 +472,7 @@ def list_files(base_dir, include_sub_dirs, walk=os.walk):
     Returns an iterable of file paths relative to base_dir.
     """
     skip_dirs = [".ipynb_checkpoints", ".git"]
-
-    def iter_files():
-        for root, sub_dirs, files in walk(base_dir):
-            if include_sub_dirs:
-                for skip in skip_dirs:
-                    if skip in sub_dirs:
-                        sub_dirs.remove(skip)
-            else:
-                # tell walk not to traverse any subdirectories
-                sub_dirs[:] = []
-
-            for filename in files:
-                yield relpath(join(root, filename), base_dir)
-
-    return list(iter_files())
+    return [rel_path for _, rel_path in walk_files(base_dir, include_sub_dirs, skip_dirs, scandir)]
 
 
 def make_notebook_source_bundle(
@@ -282,14 +493,7 @@ def make_notebook_source_bundle(
     nb_name = basename(file)
 
     manifest = make_source_manifest(AppModes.JUPYTER_NOTEBOOK, environment, nb_name, None, image)
-    if hide_all_input:
-        if "jupyter" not in manifest:
-            manifest["jupyter"] = {}
-        manifest["jupyter"].update({"hide_all_input": hide_all_input})
-    if hide_tagged_input:
-        if "jupyter" not in manifest:
-            manifest["jupyter"] = {}
-        manifest["jupyter"].update({"hide_tagged_input": hide_tagged_input})
+    manifest_add_jupyter_options(manifest, hide_all_input, hide_tagged_input)
     manifest_add_file(manifest, nb_name, base_dir)
     manifest_add_buffer(manifest, environment.filename, environment.contents)
 
@@ -297,16 +501,17 @@ def make_notebook_source_bundle(
         skip = [nb_name, environment.filename, "manifest.json"]
         extra_files = sorted(list(set(extra_files) - set(skip)))
 
-    for rel_path in extra_files:
-        manifest_add_file(manifest, rel_path, base_dir)
+    manifest_add_files(manifest, extra_files, base_dir)
 
     logger.debug("manifest: %r", manifest)
 
     bundle_file = tempfile.TemporaryFile(prefix="rsc_bundle")
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
+    with open_bundle_tarball(bundle_file) as bundle:
 
         # add the manifest first in case we want to partially untar the bundle for inspection
-        bundle_add_buffer(bundle, "manifest.json", json.dumps(manifest, indent=2))
+        # (which is also why file checksums are computed up front rather than while the
+        # files are streamed into the tarball)
+        bundle_add_buffer(bundle, "manifest.json", json_dumps(manifest, pretty=True))
         bundle_add_buffer(bundle, environment.filename, environment.contents)
         bundle_add_file(bundle, nb_name, base_dir)
 
@@ -341,8 +546,8 @@ def make_quarto_source_bundle(
     if not isdir(file_or_directory):
         base_dir = basename(file_or_directory)
 
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
-        bundle_add_buffer(bundle, "manifest.json", json.dumps(manifest, indent=2))
+    with open_bundle_tarball(bundle_file) as bundle:
+        bundle_add_buffer(bundle, "manifest.json", json_dumps(manifest, pretty=True))
         if environment:
             bundle_add_buffer(bundle, environment.filename, environment.contents)
 
@@ -411,12 +616,12 @@ def make_notebook_html_bundle(
 
     bundle_file = tempfile.TemporaryFile(prefix="rsc_bundle")
 
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
+    with open_bundle_tarball(bundle_file) as bundle:
         bundle_add_buffer(bundle, filename, output)
 
         # manifest
         manifest = make_html_manifest(filename, image)
-        bundle_add_buffer(bundle, "manifest.json", json.dumps(manifest))
+        bundle_add_buffer(bundle, "manifest.json", json_dumps(manifest))
 
     # rewind file pointer
     bundle_file.seek(0)
@@ -431,10 +636,7 @@ def keep_manifest_specified_file(relative_path):
     :param relative_path: the relative path name to check.
     :return: True, if the path should kept or False, if it should be ignored.
     """
-    for ignore_me in directories_to_ignore:
-        if relative_path.startswith(ignore_me):
-            return False
-    return True
+    return _directories_to_ignore_pattern.match(relative_path) is None
 
 
 def _default_title_from_manifest(the_manifest, manifest_file):
@@ -475,8 +677,9 @@ def read_manifest_file(manifest_path):
     :return: the parsed manifest data and the raw file content as a string.
     """
     with open(manifest_path, "rb") as f:
-        raw_manifest = f.read().decode("utf-8")
-        manifest = json.loads(raw_manifest)
+        raw_manifest = f.read()
+        manifest = json_loads(raw_manifest)
+        raw_manifest = raw_manifest.decode("utf-8")
 
     return manifest, raw_manifest
 
@@ -496,7 +699,7 @@ def make_manifest_bundle(manifest_path):
         files.remove("manifest.json")
 
     bundle_file = tempfile.TemporaryFile(prefix="rsc_bundle")
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
+    with open_bundle_tarball(bundle_file) as bundle:
         # add the manifest first in case we want to partially untar the bundle for inspection
         bundle_add_buffer(bundle, "manifest.json", raw_manifest)
 
@@ -583,16 +786,12 @@ def _create_api_file_list(
 
     file_list = []
 
-    for subdir, dirs, files in os.walk(directory):
-        for file in files:
-            abs_path = os.path.join(subdir, file)
-            rel_path = os.path.relpath(abs_path, directory)
-
-            if keep_manifest_specified_file(rel_path) and (rel_path in extra_files or not glob_set.matches(abs_path)):
-                file_list.append(rel_path)
-                # Don't add extra files more than once.
-                if rel_path in extra_files:
-                    extra_files.remove(rel_path)
+    for abs_path, rel_path in walk_files(directory):
+        if keep_manifest_specified_file(rel_path) and (rel_path in extra_files or not glob_set.matches(abs_path)):
+            file_list.append(rel_path)
+            # Don't add extra files more than once.
+            if rel_path in extra_files:
+                extra_files.remove(rel_path)
 
     for rel_path in extra_files:
         file_list.append(rel_path)
@@ -629,8 +828,7 @@ def make_api_manifest(
 
     manifest_add_buffer(manifest, environment.filename, environment.contents)
 
-    for rel_path in relevant_files:
-        manifest_add_file(manifest, rel_path, directory)
+    manifest_add_files(manifest, relevant_files, directory)
 
     return manifest, relevant_files
 
@@ -684,24 +882,17 @@ def make_html_bundle_content(
     if isfile(path):
         file_list.append(path)
     else:
-        for subdir, dirs, files in os.walk(path):
-            for file in files:
-                abs_path = os.path.join(subdir, file)
-                rel_path = os.path.relpath(abs_path, path)
-
-                if keep_manifest_specified_file(rel_path) and (
-                    rel_path in extra_files or not glob_set.matches(abs_path)
-                ):
-                    file_list.append(rel_path)
-                    # Don't add extra files more than once.
-                    if rel_path in extra_files:
-                        extra_files.remove(rel_path)
+        for abs_path, rel_path in walk_files(path):
+            if keep_manifest_specified_file(rel_path) and (rel_path in extra_files or not glob_set.matches(abs_path)):
+                file_list.append(rel_path)
+                # Don't add extra files more than once.
+                if rel_path in extra_files:
+                    extra_files.remove(rel_path)
 
     relevant_files = sorted(file_list)
     manifest = make_html_manifest(entrypoint, image)
 
-    for rel_path in relevant_files:
-        manifest_add_file(manifest, rel_path, path)
+    manifest_add_files(manifest, relevant_files, path)
 
     return manifest, relevant_files
 
@@ -748,8 +939,8 @@ def make_html_bundle(
     manifest, relevant_files = make_html_bundle_content(path, entry_point, extra_files, excludes, image)
     bundle_file = tempfile.TemporaryFile(prefix="rsc_bundle")
 
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
-        bundle_add_buffer(bundle, "manifest.json", json.dumps(manifest, indent=2))
+    with open_bundle_tarball(bundle_file) as bundle:
+        bundle_add_buffer(bundle, "manifest.json", json_dumps(manifest, pretty=True))
 
         for rel_path in relevant_files:
             bundle_add_file(bundle, rel_path, path)
@@ -786,8 +977,8 @@ def make_api_bundle(
     )
     bundle_file = tempfile.TemporaryFile(prefix="rsc_bundle")
 
-    with tarfile.open(mode="w:gz", fileobj=bundle_file) as bundle:
-        bundle_add_buffer(bundle, "manifest.json", json.dumps(manifest, indent=2))
+    with open_bundle_tarball(bundle_file) as bundle:
+        bundle_add_buffer(bundle, "manifest.json", json_dumps(manifest, pretty=True))
         bundle_add_buffer(bundle, environment.filename, environment.contents)
 
         for rel_path in relevant_files:
@@ -827,16 +1018,12 @@ def _create_quarto_file_list(
 
     file_list = []
 
-    for subdir, dirs, files in os.walk(directory):
-        for file in files:
-            abs_path = os.path.join(subdir, file)
-            rel_path = os.path.relpath(abs_path, directory)
-
-            if keep_manifest_specified_file(rel_path) and (rel_path in extra_files or not glob_set.matches(abs_path)):
-                file_list.append(rel_path)
-                # Don't add extra files more than once.
-                if rel_path in extra_files:
-                    extra_files.remove(rel_path)
+    for abs_path, rel_path in walk_files(directory):
+        if keep_manifest_specified_file(rel_path) and (rel_path in extra_files or not glob_set.matches(abs_path)):
+            file_list.append(rel_path)
+            # Don't add extra files more than once.
+            if rel_path in extra_files:
+                extra_files.remove(rel_path)
 
     for rel_path in extra_files:
         file_list.append(rel_path)
@@ -899,8 +1086,7 @@ def make_quarto_manifest(
         image,
     )
 
-    for rel_path in relevant_files:
-        manifest_add_file(manifest, rel_path, base_dir)
+    manifest_add_files(manifest, relevant_files, base_dir)
 
     return manifest, relevant_files
 
@@ -926,10 +1112,16 @@ def _default_title(file_name):
     :param file_name: the name from which the title will be derived.
     :return: the derived title.
     """
-    # Make sure we have enough of a path to derive text from.
-    file_name = abspath(file_name)
+    name = basename(file_name)
+    if name in ("", os.curdir, os.pardir):
+        # Make sure we have enough of a path to derive text from.  This is only
+        # needed here because abspath has to look up the working directory.
+        name = basename(abspath(file_name))
+    stem, dot, _ = name.rpartition(".")
+    if not dot:
+        stem = name
     # noinspection PyTypeChecker
-    return basename(file_name).rsplit(".", 1)[0][:1024].rjust(3, "0")
+    return stem[:1024].rjust(3, "0")
 
 
 def validate_file_is_notebook(file_name):
@@ -956,13 +1148,18 @@ def validate_extra_files(directory, extra_files):
     """
     result = []
     if extra_files:
+        # Resolve everything against the working directory once; relpath would look
+        # it up again for every relative path.
+        cwd = os.getcwd()
+        start = os.path.normpath(join(cwd, directory))
+
         for extra in extra_files:
-            extra_file = relpath(extra, directory)
+            extra_file = relpath(os.path.normpath(join(cwd, extra)), start)
             # It's an error if we have to leave the given dir to get to the extra
             # file.
-            if extra_file.startswith("../"):
+            if extra_file == os.pardir or extra_file.startswith(os.pardir + os.sep):
                 raise RSConnectException("%s must be under %s." % (extra_file, directory))
-            if not exists(join(directory, extra_file)):
+            if not exists(join(start, extra_file)):
                 raise RSConnectException("Could not find file %s under %s" % (extra, directory))
             result.append(extra_file)
     return result
@@ -1108,14 +1305,20 @@ def which_python(python, env=os.environ):
     """Determine which python binary should be used.
 
     In priority order:
-    * --python specified on the command line
+    * --python specified on the command line, looked up on the PATH when it's a
+      bare name that isn't a file in the current directory
     * RETICULATE_PYTHON defined in the environment
     * the python binary running this script
     """
     if python:
-        if not (exists(python) and os.access(python, os.X_OK)):
-            raise RSConnectException('The file, "%s", does not exist or is not executable.' % python)
-        return python
+        if isfile(python) and os.access(python, os.X_OK):
+            return python
+        if os.path.basename(python) == python:
+            # Just a name like "python3", so go looking for it on the PATH.
+            found = shutil.which(python, path=env.get("PATH"))
+            if found:
+                return found
+        raise RSConnectException('The file, "%s", does not exist or is not executable.' % python)
 
     if "RETICULATE_PYTHON" in env:
         return os.path.expanduser(env["RETICULATE_PYTHON"])
@@ -1123,6 +1326,35 @@ def which_python(python, env=os.environ):
     return sys.executable
 
 
+# Environments which were read from an existing package spec file, keyed by
+# _environment_cache_key().
+_environment_cache = {}  # type: typing.Dict[tuple, Environment]
+
+
+def _environment_cache_key(python, directory, conda_mode, force_generate, check_output):
+    """
+    Build the key under which an inspected environment may be cached.  The key
+    captures the state of the package spec files in the directory, so editing one
+    of them invalidates the cached environment.
+
+    :return: the cache key, or None if the environment must not be cached.
+    """
+    if force_generate:
+        # pip freeze/conda env export output depends on what is installed right now.
+        return None
+
+    spec_files = []
+    for filename in ("requirements.txt", "environment.yml"):
+        try:
+            stat = os.stat(join(directory, filename))
+            spec_files.append((filename, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            spec_files.append((filename, None, None))
+
+    conda_prefix = os.environ.get("CONDA_PREFIX") if conda_mode else None
+    return python, os.path.realpath(directory), conda_mode, conda_prefix, check_output, tuple(spec_files)
+
+
 def inspect_environment(
     python,  # type: str
     directory,  # type: str
@@ -1135,21 +1367,42 @@ def inspect_environment(
 
     Returns a dictionary of information about the environment,
     or containing an "error" field if an error occurred.
-    """
-    flags = []
-    if conda_mode:
-        flags.append("c")
-    if force_generate:
-        flags.append("f")
-    args = [python, "-m", "rsconnect.environment"]
-    if len(flags) > 0:
-        args.append("-" + "".join(flags))
-    args.append(directory)
-    try:
-        environment_json = check_output(args, universal_newlines=True)
-    except subprocess.CalledProcessError as e:
-        raise RSConnectException("Error inspecting environment: %s" % e.output)
-    return MakeEnvironment(**json.loads(environment_json))  # type: ignore
+
+    Results that come from an existing requirements.txt or environment.yml file
+    are cached until that file changes, so repeated inspections of the same
+    directory do not spawn a new Python process each time.
+    """
+    cache_key = _environment_cache_key(python, directory, conda_mode, force_generate, check_output)
+    if cache_key in _environment_cache:
+        return _environment_cache[cache_key]
+
+    if python == sys.executable and check_output is subprocess.check_output:
+        # This is the interpreter we're running in, so there's no need for a new
+        # process to inspect it.
+        try:
+            environment_info_dict = environment_info(directory, force_generate, conda_mode)
+        except EnvironmentException as exception:
+            environment_info_dict = dict(error=str(exception))
+        environment = MakeEnvironment(**environment_info_dict)
+    else:
+        flags = []
+        if conda_mode:
+            flags.append("c")
+        if force_generate:
+            flags.append("f")
+        args = [python, "-m", "rsconnect.environment"]
+        if len(flags) > 0:
+            args.append("-" + "".join(flags))
+        args.append(directory)
+        try:
+            environment_json = check_output(args, universal_newlines=True)
+        except subprocess.CalledProcessError as e:
+            raise RSConnectException("Error inspecting environment: %s" % e.output)
+        environment = MakeEnvironment(**json_loads(environment_json))  # type: ignore
+
+    if cache_key is not None and environment.source == "file" and not environment.error:
+        _environment_cache[cache_key] = environment
+    return environment
 
 
 def get_python_env_info(file_name, python, conda_mode=False, force_generate=False):
@@ -1258,8 +1511,7 @@ def write_notebook_manifest_json(
     manifest_add_file(manifest_data, file_name, directory)
     manifest_add_buffer(manifest_data, environment.filename, environment.contents)
 
-    for rel_path in extra_files:
-        manifest_add_file(manifest_data, rel_path, directory)
+    manifest_add_files(manifest_data, extra_files, directory)
 
     write_manifest_json(manifest_path, manifest_data)
 
@@ -1407,8 +1659,8 @@ def write_manifest_json(manifest_path, manifest):
     """
     Write the manifest data as JSON to the named manifest.json with a trailing newline.
     """
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write(json_dumps(manifest, pretty=True))
         f.write("\n")
 
 
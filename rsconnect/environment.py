@@ -21,8 +21,15 @@ try:
 except ImportError:
     typing = None
 
+try:
+    import importlib.metadata as importlib_metadata
+except ImportError:
+    # importlib.metadata was added in python 3.8.
+    importlib_metadata = None
+
 version_re = re.compile(r"\d+\.\d+(\.\d+)?")
 conda_version_re = re.compile(r"^(?:\s*-\s*)?python=(\d+\.\d+(?:\.\d+)?)", re.MULTILINE)
+canonical_name_re = re.compile(r"[-_.]+")
 exec_dir = os.path.dirname(sys.executable)
 
 
@@ -160,6 +167,13 @@ def get_default_locale(locale_source=locale.getdefaultlocale):
 
 
 def get_version(module):
+    if importlib_metadata is not None:
+        try:
+            return importlib_metadata.version(module)
+        except importlib_metadata.PackageNotFoundError:
+            # Not installed as a distribution; see if it runs as a module anyway.
+            pass
+
     try:
         args = [sys.executable, "-m", module, "--version"]
         proc = subprocess.Popen(
@@ -209,6 +223,31 @@ def output_file(dirname, filename, package_manager):
         raise EnvironmentException("Error reading %s: %s" % (filename, str(exception)))
 
 
+def list_distributions():
+    """List the installed distributions the way `pip list --format=freeze` does.
+
+    Distributions are found by searching `sys.path`, so the current interpreter
+    does not need to start `pip` in a new process to get the same listing.
+
+    :return: a list of `name==version` strings, sorted by canonical name.
+    :raises EnvironmentException: if `importlib.metadata` is not available
+    (before Python 3.8).
+    """
+    if importlib_metadata is None:
+        raise EnvironmentException("Listing distributions requires importlib.metadata (Python 3.8 or later)")
+
+    packages = {}
+    for dist in importlib_metadata.distributions():
+        name = dist.metadata["Name"]
+        if not name:
+            continue
+        canonical_name = canonical_name_re.sub("-", name).lower()
+        # Like imports, the first distribution found on sys.path wins.
+        if canonical_name not in packages:
+            packages[canonical_name] = "%s==%s" % (name, dist.version)
+    return [packages[canonical_name] for canonical_name in sorted(packages)]
+
+
 def pip_freeze():
     """Inspect the environment using `pip freeze`.
 
@@ -216,6 +255,13 @@ def pip_freeze():
     (always 'requirements.txt') and contents if successful,
     or a dictionary containing 'error' on failure.
     """
+    if importlib_metadata is not None:
+        try:
+            pip_stdout = "".join(line + "\n" for line in list_distributions())
+        except Exception as exception:
+            raise EnvironmentException("Error during pip freeze: %s" % str(exception))
+        return _pip_freeze_result(pip_stdout)
+
     try:
         proc = subprocess.Popen(
             [sys.executable, "-m", "pip", "list", "--format=freeze"],
@@ -233,6 +279,10 @@ def pip_freeze():
         msg = pip_stderr or ("exited with code %d" % pip_status)
         raise EnvironmentException("Error during pip freeze: %s" % msg)
 
+    return _pip_freeze_result(pip_stdout)
+
+
+def _pip_freeze_result(pip_stdout):
     pip_stdout = "\n".join([line for line in pip_stdout.split("\n") if "rsconnect" not in line])
 
     pip_stdout = (
@@ -285,6 +335,26 @@ def conda_env_export(conda):
     }
 
 
+def environment_info(directory, force_generate=False, conda_mode=False):
+    # type: (str, bool, bool) -> typing.Dict[str, typing.Any]
+    """
+    Run `detect_environment` and clean up the package spec contents so they can be
+    installed elsewhere.  This is what `python -m rsconnect.environment` reports.
+
+    :param directory: the directory to inspect.
+    :param force_generate: force the generation of an environment.
+    :param conda_mode: inspect the environment assuming Conda.
+    :return: the environment information as a dictionary.
+    """
+    envinfo = detect_environment(directory, force_generate, conda_mode)._asdict()
+    if "contents" in envinfo:
+        keepers = list(map(strip_ref, envinfo["contents"].split("\n")))
+        if not conda_mode:
+            keepers = [line for line in keepers if not exclude(line)]
+        envinfo["contents"] = "\n".join(keepers)
+    return envinfo
+
+
 def main():
     """
     Run `detect_environment` and dump the result as JSON.
@@ -303,12 +373,7 @@ def main():
             force_generate = True
         if "c" in flags:
             conda_mode = True
-        envinfo = detect_environment(directory, force_generate, conda_mode)._asdict()
-        if "contents" in envinfo:
-            keepers = list(map(strip_ref, envinfo["contents"].split("\n")))
-            if not conda_mode:
-                keepers = [line for line in keepers if not exclude(line)]
-            envinfo["contents"] = "\n".join(keepers)
+        envinfo = environment_info(directory, force_generate, conda_mode)
 
         json.dump(
             envinfo,
@@ -1,24 +1,36 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
+import os
 import shutil
+import subprocess
 import sys
-import tarfile
 import tempfile
 
 from unittest import TestCase
 from os.path import dirname, join
 
+import rsconnect.bundle
 from rsconnect.environment import detect_environment
 from rsconnect.bundle import (
     _default_title,
     _default_title_from_manifest,
     _validate_title,
+    bundle_add_buffer,
+    file_checksum,
+    file_checksums,
     inspect_environment,
+    json_dumps,
+    json_loads,
     list_files,
     make_manifest_bundle,
     make_notebook_html_bundle,
     make_notebook_source_bundle,
     keep_manifest_specified_file,
+    manifest_add_file,
+    manifest_add_files,
+    manifest_add_jupyter_options,
+    open_bundle_tarball,
     to_bytes,
     make_source_manifest,
     make_quarto_manifest,
@@ -26,11 +38,13 @@ from rsconnect.bundle import (
     validate_entry_point,
     validate_extra_files,
     which_python,
+    read_manifest_file,
+    write_manifest_json,
 )
 from rsconnect.exception import RSConnectException
 from rsconnect.models import AppModes
 from rsconnect.environment import Environment
-from .utils import get_dir, get_manifest_path
+from .utils import get_dir, get_manifest_path, open_bundle, write_files
 
 
 class TestBundle(TestCase):
@@ -49,6 +63,136 @@ class TestBundle(TestCase):
         self.assertEqual(to_bytes("abc123"), b"abc123")
         self.assertEqual(to_bytes("åbc123"), b"\xc3\xa5bc123")
 
+        data = b"abc123"
+        self.assertIs(to_bytes(data), data)
+
+        class Text(str):
+            pass
+
+        self.assertEqual(to_bytes(Text("åbc123")), b"\xc3\xa5bc123")
+
+    def test_json_dumps_loads(self):
+        data = {"version": 1, "metadata": {"appmode": "static"}, "files": {}}
+        self.assertEqual(json_dumps(data, pretty=True), json.dumps(data, indent=2))
+        self.assertEqual(json_loads(json_dumps(data)), data)
+        self.assertEqual(json_loads(json_dumps(data).encode("utf-8")), data)
+
+    def test_file_checksum(self):
+        directory = tempfile.mkdtemp()
+
+        try:
+            # one file read in chunks and one large enough to be memory mapped
+            for size in (1000, 300 * 1024):
+                data = bytes(range(256)) * (size // 256)
+                path = join(directory, "data%d.bin" % size)
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.assertEqual(file_checksum(path), hashlib.md5(data).hexdigest())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_file_checksums(self):
+        directory = get_dir("pip2")
+        paths = [join(directory, "data.csv"), join(directory, "dummy.ipynb")]
+        expected = {path: file_checksum(path) for path in paths}
+        threshold = rsconnect.bundle.parallel_checksum_threshold
+
+        try:
+            # a zero threshold uses the thread pool whenever there is more than one CPU
+            for parallel_checksum_threshold in (threshold, 0):
+                rsconnect.bundle.parallel_checksum_threshold = parallel_checksum_threshold
+                self.assertEqual(file_checksums(paths), expected)
+                self.assertEqual(file_checksums([]), {})
+
+                with self.assertRaises(OSError):
+                    file_checksums(paths + [join(directory, "not_a_file.txt")])
+        finally:
+            rsconnect.bundle.parallel_checksum_threshold = threshold
+
+        # the sizes are only read until the threshold is reached
+        missing = join(directory, "not_a_file.txt")
+        self.assertTrue(rsconnect.bundle._total_size_reaches(paths + [missing], 1))
+        self.assertFalse(rsconnect.bundle._total_size_reaches(paths, threshold))
+        self.assertFalse(rsconnect.bundle._total_size_reaches([], 1))
+
+    def test_json_orjson(self):
+        class FakeOrjson:
+            # Behaves like orjson for what json_dumps/json_loads use: UTF-8 bytes
+            # out, with non-ASCII characters left unescaped.
+            OPT_INDENT_2 = 1
+
+            @staticmethod
+            def dumps(data, option=0):
+                return json.dumps(data, indent=2 if option else None, ensure_ascii=False).encode("utf-8")
+
+            @staticmethod
+            def loads(raw):
+                return json.loads(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+
+        directory = tempfile.mkdtemp()
+        manifest = {"version": 1, "files": {"données.csv": {"checksum": "abc"}}}
+        real_orjson = rsconnect.bundle.orjson
+
+        try:
+            for backend in (None, FakeOrjson):
+                rsconnect.bundle.orjson = backend
+                manifest_path = join(directory, "manifest.json")
+                write_manifest_json(manifest_path, manifest)
+
+                with open(manifest_path, "rb") as f:
+                    text = f.read().decode("utf-8")
+                self.assertEqual(json.loads(text), manifest)
+                if backend is not None:
+                    self.assertIn("données.csv", text)
+
+                parsed, raw = read_manifest_file(manifest_path)
+                self.assertEqual(parsed, manifest)
+                self.assertEqual(json.loads(raw), manifest)
+                self.assertEqual(json_loads(json_dumps(manifest)), manifest)
+        finally:
+            rsconnect.bundle.orjson = real_orjson
+            shutil.rmtree(directory)
+
+    def test_manifest_add_files(self):
+        directory = get_dir("pip2")
+        names = ["data.csv", "dummy.ipynb"]
+
+        expected = {}
+        for name in names:
+            manifest_add_file(expected, name, directory)
+
+        manifest = {}
+        manifest_add_files(manifest, names, directory)
+        self.assertEqual(manifest, expected)
+        self.assertEqual(manifest["files"]["data.csv"], {"checksum": "f2bd77cc2752b3efbb732b761d2aa3c3"})
+
+        manifest = {}
+        manifest_add_files(manifest, [], directory)
+        self.assertEqual(manifest, {})
+
+    def test_open_bundle_tarball(self):
+        fake_pigz = join(dirname(__file__), "testdata", "fake_pigz.sh")
+
+        for which in (lambda name: None, lambda name: fake_pigz):
+            with tempfile.TemporaryFile() as bundle_file:
+                with open_bundle_tarball(bundle_file, which=which) as bundle:
+                    bundle_add_buffer(bundle, "manifest.json", "{}")
+                bundle_file.seek(0)
+
+                with open_bundle(bundle_file) as tar:
+                    self.assertEqual(tar.getnames(), ["manifest.json"])
+                    self.assertEqual(tar.extractfile("manifest.json").read(), b"{}")
+
+    def test_open_bundle_tarball_failure(self):
+        fake_broken_pigz = join(dirname(__file__), "testdata", "fake_broken_pigz.sh")
+
+        # small enough to sit in the pipe buffer, and large enough to hit a broken pipe
+        for size in (10, 1024 * 1024):
+            with tempfile.TemporaryFile() as bundle_file:
+                with self.assertRaises(RSConnectException):
+                    with open_bundle_tarball(bundle_file, which=lambda name: fake_broken_pigz) as bundle:
+                        bundle_add_buffer(bundle, "data.bin", b"x" * size)
+
     def test_source_bundle1(self):
         self.maxDiff = 5000
         directory = get_dir("pip1")
@@ -61,7 +205,7 @@ class TestBundle(TestCase):
         environment = detect_environment(directory)
         with make_notebook_source_bundle(
             nb_path, environment, None, hide_all_input=False, hide_tagged_input=False, image=None
-        ) as bundle, tarfile.open(mode="r:gz", fileobj=bundle) as tar:
+        ) as bundle, open_bundle(bundle) as tar:
 
             names = sorted(tar.getnames())
             self.assertEqual(
@@ -130,7 +274,7 @@ class TestBundle(TestCase):
             hide_all_input=False,
             hide_tagged_input=False,
             image="rstudio/connect:bionic",
-        ) as bundle, tarfile.open(mode="r:gz", fileobj=bundle) as tar:
+        ) as bundle, open_bundle(bundle) as tar:
 
             names = sorted(tar.getnames())
             self.assertEqual(
@@ -199,28 +343,35 @@ class TestBundle(TestCase):
             ".git/config",
         ]
 
-        def walk(base_dir):
-            dir_names = []
-            file_names = []
+        class FakeEntry:
+            def __init__(self, dir_path, name, is_dir):
+                self.name = name
+                self.path = join(dir_path, name)
+                self._is_dir = is_dir
 
-            for path in paths:
-                if "/" in path:
-                    dir_name, file_name = path.split("/", 1)
-                    dir_names.append(dir_name)
-                else:
-                    file_names.append(path)
+            def is_dir(self):
+                return self._is_dir
 
-            yield base_dir, dir_names, file_names
+            def is_symlink(self):
+                return False
 
-            for subdir in dir_names:
-                for path in paths:
-                    if path.startswith(subdir + "/"):
-                        yield base_dir + "/" + subdir, [], [path.split("/", 1)[1]]
+        def scandir(dir_path):
+            prefix = dir_path.strip("/")
+            prefix = prefix + "/" if prefix else ""
+            seen = set()
 
-        files = list_files("/", True, walk=walk)
+            for path in paths:
+                if not path.startswith(prefix):
+                    continue
+                name, sep, _ = path[len(prefix) :].partition("/")
+                if name not in seen:
+                    seen.add(name)
+                    yield FakeEntry(dir_path, name, bool(sep))
+
+        files = list_files("/", True, scandir=scandir)
         self.assertEqual(files, paths[:4])
 
-        files = list_files("/", False, walk=walk)
+        files = list_files("/", False, scandir=scandir)
         self.assertEqual(files, paths[:2])
 
     def test_html_bundle1(self):
@@ -241,7 +392,7 @@ class TestBundle(TestCase):
             image=None,
         )
 
-        tar = tarfile.open(mode="r:gz", fileobj=bundle)
+        tar = open_bundle(bundle)
 
         try:
             names = sorted(tar.getnames())
@@ -284,13 +435,19 @@ class TestBundle(TestCase):
         self.assertFalse(keep_manifest_specified_file("venv/lib/python3.8/site-packages/wheel/__init__.py"))
         # noinspection SpellCheckingInspection
         self.assertFalse(keep_manifest_specified_file(".Rproj.user/bogus.file"))
+        self.assertFalse(keep_manifest_specified_file(".git/config"))
+        self.assertFalse(keep_manifest_specified_file("__pycache__/app.cpython-38.pyc"))
+        self.assertFalse(keep_manifest_specified_file("renv/activate.R"))
+        self.assertTrue(keep_manifest_specified_file("envy.py"))
+        self.assertTrue(keep_manifest_specified_file("venvs/notes.txt"))
+        self.assertTrue(keep_manifest_specified_file("data/venv/notes.txt"))
 
     def test_manifest_bundle(self):
         self.maxDiff = 5000
         # noinspection SpellCheckingInspection
         manifest_path = join(dirname(__file__), "testdata", "R", "shinyapp", "manifest.json")
 
-        with make_manifest_bundle(manifest_path) as bundle, tarfile.open(mode="r:gz", fileobj=bundle) as tar:
+        with make_manifest_bundle(manifest_path) as bundle, open_bundle(bundle) as tar:
             tar_names = sorted(tar.getnames())
             manifest = json.loads(tar.extractfile("manifest.json").read().decode("utf-8"))
             manifest_names = sorted(filter(keep_manifest_specified_file, manifest["files"].keys()))
@@ -393,6 +550,17 @@ class TestBundle(TestCase):
             },
         )
 
+    def test_manifest_add_jupyter_options(self):
+        manifest = {"version": 1}
+        manifest_add_jupyter_options(manifest, False, False)
+        self.assertEqual(manifest, {"version": 1})
+
+        manifest_add_jupyter_options(manifest, True, False)
+        self.assertEqual(manifest, {"version": 1, "jupyter": {"hide_all_input": True}})
+
+        manifest_add_jupyter_options(manifest, False, True)
+        self.assertEqual(manifest, {"version": 1, "jupyter": {"hide_all_input": True, "hide_tagged_input": True}})
+
     def test_make_quarto_manifest(self):
         temp = tempfile.mkdtemp()
 
@@ -452,10 +620,7 @@ class TestBundle(TestCase):
         )
 
         # Files used within this test
-        fp = open(join(temp, "requirements.txt"), "w")
-        fp.write("dash\n")
-        fp.write("pandas\n")
-        fp.close()
+        write_files(temp, {"requirements.txt": b"dash\npandas\n"})
 
         # include environment parameter
         manifest, _ = make_quarto_manifest(
@@ -497,15 +662,14 @@ class TestBundle(TestCase):
         )
 
         # include extra_files parameter
-        fp = open(join(temp, "a"), "w")
-        fp.write("This is file a\n")
-        fp.close()
-        fp = open(join(temp, "b"), "w")
-        fp.write("This is file b\n")
-        fp.close()
-        fp = open(join(temp, "c"), "w")
-        fp.write("This is file c\n")
-        fp.close()
+        write_files(
+            temp,
+            {
+                "a": b"This is file a\n",
+                "b": b"This is file b\n",
+                "c": b"This is file c\n",
+            },
+        )
         manifest, _ = make_quarto_manifest(
             temp,
             {
@@ -612,6 +776,21 @@ class TestBundle(TestCase):
             ["index.htm"],
         )
 
+        self.assertEqual(
+            validate_extra_files(directory, [join(directory, "index.htm"), join(directory, "app.R")]),
+            ["index.htm", "app.R"],
+        )
+        self.assertEqual(
+            validate_extra_files(directory, [join(directory, "packrat", "desc", "BH"), join(directory, "packrat")]),
+            [join("packrat", "desc", "BH"), "packrat"],
+        )
+
+        with self.assertRaises(RSConnectException):
+            validate_extra_files(directory, [join(directory, "index.htm"), join(directory, "not_a_file.txt")])
+
+        with self.assertRaises(RSConnectException):
+            validate_extra_files(directory, [dirname(directory)])
+
     def test_validate_title(self):
         with self.assertRaises(RSConnectException):
             _validate_title("12")
@@ -651,11 +830,22 @@ class TestBundle(TestCase):
         self.assertEqual(which_python(None), sys.executable)
         self.assertEqual(which_python(None, {"RETICULATE_PYTHON": "fake-python"}), "fake-python")
 
+        # bare names are looked up on the PATH
+        python_dir, python_name = os.path.split(sys.executable)
+        self.assertEqual(which_python(python_name, {"PATH": python_dir}), join(python_dir, python_name))
+
+        # directories aren't pythons, even though they are "executable"
+        with self.assertRaises(RSConnectException):
+            which_python(python_dir)
+
     def test_default_title(self):
         self.assertEqual(_default_title("testing.txt"), "testing")
         self.assertEqual(_default_title("this.is.a.test.ext"), "this.is.a.test")
         self.assertEqual(_default_title("1.ext"), "001")
         self.assertEqual(_default_title("%s.ext" % ("n" * 2048)), "n" * 1024)
+        self.assertEqual(_default_title("dir/to/archive.tar.gz"), "archive.tar")
+        self.assertEqual(_default_title("dir/to/"), "0to")
+        self.assertEqual(_default_title("dir/to/.."), "dir")
 
     def test_default_title_from_manifest(self):
         self.assertEqual(_default_title_from_manifest({}, "dir/to/manifest.json"), "0to")
@@ -676,3 +866,44 @@ class TestBundle(TestCase):
         environment = inspect_environment(sys.executable, get_dir("pip1"))
         assert environment is not None
         assert environment.python != ""
+
+    def test_inspect_environment_in_process(self):
+        def check_output(*args, **kwargs):
+            return subprocess.check_output(*args, **kwargs)
+
+        # Inspecting the running interpreter happens in-process but must match
+        # what a separate process reports.
+        in_process = inspect_environment(sys.executable, get_dir("pip1"))
+        in_subprocess = inspect_environment(sys.executable, get_dir("pip1"), check_output=check_output)
+        self.assertEqual(in_process, in_subprocess)
+
+    def test_inspect_environment_cache(self):
+        directory = tempfile.mkdtemp()
+        calls = []
+
+        def check_output(args, **kwargs):
+            calls.append(args)
+            return json.dumps({"filename": "requirements.txt", "contents": "numpy\n", "source": "file"})
+
+        try:
+            requirements = join(directory, "requirements.txt")
+            with open(requirements, "w") as f:
+                f.write("numpy\n")
+
+            first = inspect_environment(sys.executable, directory, check_output=check_output)
+            second = inspect_environment(sys.executable, directory, check_output=check_output)
+            self.assertIs(first, second)
+            self.assertEqual(len(calls), 1)
+
+            # Changing the spec file invalidates the cached result.
+            stat = os.stat(requirements)
+            os.utime(requirements, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+            inspect_environment(sys.executable, directory, check_output=check_output)
+            self.assertEqual(len(calls), 2)
+
+            # Forcing generation never uses the cache.
+            inspect_environment(sys.executable, directory, force_generate=True, check_output=check_output)
+            inspect_environment(sys.executable, directory, force_generate=True, check_output=check_output)
+            self.assertEqual(len(calls), 4)
+        finally:
+            shutil.rmtree(directory)
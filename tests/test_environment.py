@@ -1,7 +1,7 @@
 import re
 import sys
 
-from unittest import TestCase
+from unittest import TestCase, skipIf
 from os.path import dirname, join
 
 from rsconnect.environment import (
@@ -10,6 +10,8 @@ from rsconnect.environment import (
     detect_environment,
     get_default_locale,
     get_python_version,
+    importlib_metadata,
+    list_distributions,
 )
 from .utils import get_dir
 
@@ -75,6 +77,17 @@ class TestEnvironment(TestCase):
         )
         self.assertEqual(expected, result)
 
+    @skipIf(importlib_metadata is None, "importlib.metadata requires Python 3.8 or later")
+    def test_list_distributions(self):
+        distributions = list_distributions()
+        names = [re.sub(r"[-_.]+", "-", line.split("==", 1)[0]).lower() for line in distributions]
+
+        # these are the dependencies declared in our setup.py
+        self.assertIn("six", names)
+        self.assertIn("click", names)
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), len(set(names)))
+
     def test_conda_env_export(self):
         fake_conda = join(dirname(__file__), "testdata", "fake_conda.sh")
         result = detect_environment(get_dir("conda1"), conda_mode=True, force_generate=True, conda=fake_conda)
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+exit 3
@@ -1,5 +1,7 @@
+import io
 import sys
 import os
+import tarfile
 from os.path import join, dirname, exists
 
 import pytest
@@ -62,3 +64,30 @@ def get_api_path(name, parent="api"):
     if not exists(path):
         raise AssertionError("%s does not exist" % path)
     return path
+
+
+def open_bundle(bundle):
+    """
+    Open a bundle tarball for reading.  The gzip reader pulls its input in small
+    chunks, so the bundle is read through a larger buffer to keep those chunk
+    reads out of the file system.
+    """
+    return tarfile.open(mode="r:gz", fileobj=io.BufferedReader(bundle, buffer_size=128 * 1024))
+
+
+def write_files(directory, files):
+    """
+    Write test files into the given directory.  Each file is written with a single
+    write through the raw file descriptor, skipping Python's buffered text layer.
+
+    :param directory: the directory to write the files in.
+    :param files: a dictionary mapping file names to their contents as bytes.
+    """
+    # O_BINARY keeps Windows from translating line endings.
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    for name, contents in files.items():
+        fd = os.open(join(directory, name), flags, 0o644)
+        try:
+            os.write(fd, contents)
+        finally:
+            os.close(fd)